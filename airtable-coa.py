@@ -2,6 +2,10 @@ import os
 import time
 import requests
 import json
+import csv
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pyairtable import Api
 import logging
@@ -21,6 +25,25 @@ EXCLUDED_CATEGORIES = os.environ.get('EXCLUDED_CATEGORIES', 'Pet Products,Access
 # Square API base URL
 SQUARE_BASE_URL = 'https://connect.squareup.com/v2'
 
+# Default location of the sync plan written by --plan and read by --apply-plan
+PLAN_FILE = os.environ.get('PLAN_FILE', 'sync_plan.json')
+
+# Plans older than this are refused by --apply-plan, since Airtable may have changed since
+PLAN_MAX_AGE_MINUTES = float(os.environ.get('PLAN_MAX_AGE_MINUTES', '60'))
+
+# Request rates used to estimate wall time for a plan (Airtable allows 5 requests/sec per base)
+SQUARE_REQUESTS_PER_SECOND = float(os.environ.get('SQUARE_REQUESTS_PER_SECOND', '10'))
+AIRTABLE_REQUESTS_PER_SECOND = float(os.environ.get('AIRTABLE_REQUESTS_PER_SECOND', '5'))
+
+# Number of catalog object IDs sent per inventory batch request
+INVENTORY_BATCH_SIZE = 500
+
+# Optional fan-out configuration: a JSON list of targets, each with a name, location_id,
+# base_id, table, vendor_table and requests_per_second. Missing keys fall back to the
+# single-target settings above, so leaving this unset syncs one location into one base.
+# Targets in the same base share one rate budget, at the lowest rate any of them sets.
+SYNC_TARGETS = os.environ.get('SYNC_TARGETS')
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -32,16 +55,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger("COA_Sync")
 
-# Initialize sync stats
-stats = {
-    'processed': 0,
-    'created': 0,
-    'updated': 0,
-    'skipped': 0,
-    'removed': 0,
-    'total': 0
+# Square API request counter, used for plan cost estimates. Airtable requests are
+# counted per target in its stats.
+api_calls = {
+    'square': 0
 }
 
+def new_stats():
+    """Return a fresh set of sync stats for one target"""
+    return {
+        'processed': 0,
+        'created': 0,
+        'updated': 0,
+        'skipped': 0,
+        'removed': 0,
+        'total': 0,
+        'airtable_requests': 0
+    }
+
+def load_sync_targets():
+    """Build the list of sync targets from SYNC_TARGETS or the single-target settings
+    
+    Raises ValueError if the configuration is malformed.
+    """
+    try:
+        configs = json.loads(SYNC_TARGETS) if SYNC_TARGETS else [{}]
+    except json.JSONDecodeError as e:
+        raise ValueError(f"SYNC_TARGETS is not valid JSON: {str(e)}")
+    
+    if not isinstance(configs, list) or not configs:
+        raise ValueError("SYNC_TARGETS must be a non-empty JSON list")
+    
+    targets = []
+    for config in configs:
+        if not isinstance(config, dict):
+            raise ValueError(f"Sync target must be a JSON object, got: {json.dumps(config)}")
+        
+        base_id = config.get('base_id', AIRTABLE_BASE_ID)
+        table = config.get('table', AIRTABLE_TABLE_NAME)
+        name = config.get('name', f"{base_id}/{table}")
+        
+        try:
+            requests_per_second = float(config.get('requests_per_second', AIRTABLE_REQUESTS_PER_SECOND))
+        except (ValueError, TypeError):
+            raise ValueError(f"Sync target {name} has an invalid requests_per_second: {config.get('requests_per_second')}")
+        if requests_per_second <= 0:
+            raise ValueError(f"Sync target {name} must have a positive requests_per_second")
+        
+        location_id = config.get('location_id', SQUARE_LOCATION_ID)
+        if not location_id or not isinstance(location_id, str):
+            raise ValueError(f"Sync target {name} has no Square location_id")
+        
+        if any(target['name'] == name for target in targets):
+            raise ValueError(f"Duplicate sync target name: {name}")
+        
+        # Each target deletes products it did not keep, so two targets on one table would undo each other
+        if any((target['base_id'], target['table']) == (base_id, table) for target in targets):
+            raise ValueError(f"Sync target {name} writes to {base_id}/{table}, which another target already uses")
+        
+        targets.append({
+            'name': name,
+            'location_id': location_id,
+            'base_id': base_id,
+            'table': table,
+            'vendor_table': config.get('vendor_table', AIRTABLE_VENDOR_TABLE),
+            'requests_per_second': requests_per_second,
+            'stats': new_stats()
+        })
+    
+    # Airtable's rate limit is per base, so targets sharing a base share one budget
+    rate_limits = {}
+    for target in targets:
+        rate_limit = rate_limits.setdefault(target['base_id'], {
+            'lock': threading.Lock(),
+            'next_request_at': 0.0,
+            'requests_per_second': target['requests_per_second']
+        })
+        rate_limit['requests_per_second'] = min(rate_limit['requests_per_second'], target['requests_per_second'])
+        target['rate_limit'] = rate_limit
+    
+    return targets
+
+def throttle(target):
+    """Wait for the target's base rate budget before making an Airtable request"""
+    rate_limit = target['rate_limit']
+    
+    # Reserve the next slot under the lock, then sleep outside it so other threads can queue up
+    with rate_limit['lock']:
+        now = time.time()
+        wait = rate_limit['next_request_at'] - now
+        rate_limit['next_request_at'] = max(now, rate_limit['next_request_at']) + 1 / rate_limit['requests_per_second']
+    
+    if wait > 0:
+        time.sleep(wait)
+    target['stats']['airtable_requests'] += 1
+
 def fetch_square_categories():
     """Fetch all categories from Square API"""
     logger.info("Fetching categories from Square API...")
@@ -61,6 +169,7 @@ def fetch_square_categories():
         }
         
         try:
+            api_calls['square'] += 1
             response = requests.get(endpoint, headers=headers)
             response.raise_for_status()
             data = response.json()
@@ -108,8 +217,12 @@ def is_excluded_category(category_id, category_name, category_map):
     
     return False
 
-def get_inventory_counts(catalog_item_id):
-    """Get inventory counts for an item across all locations"""
+def get_inventory_counts(catalog_object_ids, location_ids):
+    """Get inventory counts for many items across the given locations
+    
+    Raises RuntimeError if any batch fails, since missing counts would read as out of stock
+    and remove those products from Airtable.
+    """
     endpoint = f"{SQUARE_BASE_URL}/inventory/batch-retrieve-counts"
     
     headers = {
@@ -118,20 +231,31 @@ def get_inventory_counts(catalog_item_id):
         'Content-Type': 'application/json'
     }
     
-    body = {
-        'catalog_object_ids': [catalog_item_id],
-        'location_ids': [SQUARE_LOCATION_ID]
-    }
-    
-    try:
-        response = requests.post(endpoint, headers=headers, json=body)
-        response.raise_for_status()
-        data = response.json()
+    counts = []
+    for i in range(0, len(catalog_object_ids), INVENTORY_BATCH_SIZE):
+        body = {
+            'catalog_object_ids': catalog_object_ids[i:i + INVENTORY_BATCH_SIZE],
+            'location_ids': location_ids
+        }
         
-        return data.get('counts', [])
-    except Exception as e:
-        logger.error(f"Error fetching inventory: {str(e)}")
-        return []
+        while True:
+            try:
+                api_calls['square'] += 1
+                response = requests.post(endpoint, headers=headers, json=body)
+                response.raise_for_status()
+                data = response.json()
+                
+                counts.extend(data.get('counts', []))
+                
+                cursor = data.get('cursor')
+                if not cursor:
+                    break
+                body['cursor'] = cursor
+            except Exception as e:
+                logger.error(f"Error fetching inventory: {str(e)}")
+                raise RuntimeError(f"Inventory retrieval failed for locations {', '.join(location_ids)}") from e
+    
+    return counts
 
 def has_stock(inventory_counts):
     """Check if item has stock in any location"""
@@ -149,8 +273,8 @@ def has_stock(inventory_counts):
     
     return False
 
-def fetch_square_items():
-    """Fetch all items from Square API"""
+def fetch_square_items(location_ids):
+    """Fetch all items from Square API, grouped by the locations where they have stock"""
     logger.info("Fetching items from Square API...")
     
     items = []
@@ -169,6 +293,7 @@ def fetch_square_items():
         }
         
         try:
+            api_calls['square'] += 1
             response = requests.get(endpoint, headers=headers)
             response.raise_for_status()
             data = response.json()
@@ -211,13 +336,6 @@ def fetch_square_items():
                                 if vendor_id:
                                     break
                         
-                        # Check inventory for this variation
-                        inventory_counts = get_inventory_counts(variation_id)
-                        if not has_stock(inventory_counts):
-                            logger.info(f"Skipping variation {item_name} - {variation_name} - out of stock")
-                            continue
-                            
-                        # Variation has stock, add to list
                         full_name = item_name
                         if variation_name and variation_name != item_name:
                             full_name = f"{item_name} - {variation_name}"
@@ -235,11 +353,6 @@ def fetch_square_items():
                         })
                 else:
                     # Simple product without variations
-                    inventory_counts = get_inventory_counts(item.get('id'))
-                    if not has_stock(inventory_counts):
-                        logger.info(f"Skipping item {item_name} - out of stock")
-                        continue
-                        
                     items.append({
                         'id': item.get('id'),
                         'name': item_name,
@@ -260,18 +373,51 @@ def fetch_square_items():
             logger.error(f"Error fetching items: {str(e)}")
             break
     
-    logger.info(f"Fetched {len(items)} items with stock from Square")
-    return items
+    # Check inventory for every item and location in batched calls
+    counts_by_location = {location_id: {} for location_id in location_ids}
+    for count in get_inventory_counts([item['id'] for item in items], location_ids):
+        location_counts = counts_by_location.get(count.get('location_id'))
+        if location_counts is not None:
+            location_counts.setdefault(count.get('catalog_object_id'), []).append(count)
+    
+    items_by_location = {}
+    for location_id, location_counts in counts_by_location.items():
+        items_by_location[location_id] = []
+        for item in items:
+            if not has_stock(location_counts.get(item['id'])):
+                logger.info(f"Skipping {item['name']} at location {location_id} - out of stock")
+                continue
+            items_by_location[location_id].append(item)
+        
+        logger.info(f"Fetched {len(items_by_location[location_id])} items with stock at location {location_id} from Square")
+    
+    return items_by_location
 
-def get_existing_airtable_products():
-    """Get all existing products from Airtable"""
-    logger.info("Fetching existing products from Airtable...")
+def fetch_airtable_records(target, table_name):
+    """Fetch all records from a table, page by page within the target's base rate budget"""
+    table = Api(AIRTABLE_API_KEY).table(target['base_id'], table_name)
+    pages = table.iterate()
+    
+    records = []
+    while True:
+        throttle(target)
+        page = next(pages, None)
+        if page is None:
+            # The last page had no offset, so this call made no request
+            target['stats']['airtable_requests'] -= 1
+            break
+        records.extend(page)
+    
+    return records
+
+def get_existing_airtable_products(target):
+    """Get all existing products from a target's Airtable base"""
+    logger.info(f"Fetching existing products from Airtable for target {target['name']}...")
     
     existing_products = {}
     
     try:
-        table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
-        records = table.all()
+        records = fetch_airtable_records(target, target['table'])
         
         for record in records:
             product_id = record['fields'].get('ProductID')
@@ -284,15 +430,14 @@ def get_existing_airtable_products():
         logger.error(f"Error fetching Airtable products: {str(e)}")
         return {}
 
-def get_existing_airtable_vendors():
-    """Get all existing vendors from Airtable"""
-    logger.info("Fetching existing vendors from Airtable...")
+def get_existing_airtable_vendors(target):
+    """Get all existing vendors from a target's Airtable base"""
+    logger.info(f"Fetching existing vendors from Airtable for target {target['name']}...")
     
     existing_vendors = {}
     
     try:
-        table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_VENDOR_TABLE)
-        records = table.all()
+        records = fetch_airtable_records(target, target['vendor_table'])
         
         for record in records:
             vendor_id = record['fields'].get('VendorID')
@@ -305,24 +450,25 @@ def get_existing_airtable_vendors():
         logger.error(f"Error fetching Airtable vendors: {str(e)}")
         return {}
 
-def sync_square_to_airtable():
-    """Main function to sync Square products to Airtable"""
-    logger.info("Starting Square to Airtable sync...")
-    
-    # Get items from Square
-    items = fetch_square_items()
-    stats['total'] = len(items)
-    
+def plan_square_sync(target, items):
+    """Diff Square items against a target's Airtable products into a change set"""
     # Get existing products from Airtable
-    existing_products = get_existing_airtable_products()
+    existing_products = get_existing_airtable_products(target)
+    
+    changes = {
+        'table': target['table'],
+        'total': len(items),
+        'skipped': 0,
+        'creates': [],
+        'updates': [],
+        'deletes': []
+    }
     
     # Track product IDs to keep
     products_to_keep = set()
     
     # Process each item
     for item in items:
-        stats['processed'] += 1
-        
         product_id = item['id']
         name = item['name']
         category_name = item['category_name']
@@ -331,20 +477,19 @@ def sync_square_to_airtable():
         # Skip if category is in excluded list (but allow empty categories)
         if category_name and is_excluded_category(None, category_name, None):
             logger.info(f"Skipping product {name} - category {category_name} is excluded")
-            stats['skipped'] += 1
+            changes['skipped'] += 1
             continue
         
         # Record should be kept
         products_to_keep.add(product_id)
         
-        # Prepare Airtable record data
+        # Prepare Airtable record data; 'Last Updated' is stamped when the change is applied
         record_data = {
             'ProductID': product_id,
             'Product Name': name,
             'Current Quantity': item['quantity'],
             'Item Data Ecom Available': True,
             'Present At All Locations': True,
-            'Last Updated': datetime.now().strftime('%m/%d/%Y %I:%M %p'),
             'SKU': item['sku']
         }
         
@@ -358,38 +503,79 @@ def sync_square_to_airtable():
         
         # Check if product already exists
         if product_id in existing_products:
-            # Update existing record
-            record = existing_products[product_id]
-            try:
-                table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
-                table.update(record['id'], record_data)
-                logger.info(f"Updated product: {name}")
-                stats['updated'] += 1
-            except Exception as e:
-                logger.error(f"Error updating product {name}: {str(e)}")
+            changes['updates'].append({
+                'key': product_id,
+                'record_id': existing_products[product_id]['id'],
+                'name': name,
+                'fields': record_data
+            })
         else:
-            # Create new record
-            try:
-                table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
-                table.create(record_data)
-                logger.info(f"Created product: {name}")
-                stats['created'] += 1
-            except Exception as e:
-                logger.error(f"Error creating product {name}: {str(e)}")
+            changes['creates'].append({
+                'key': product_id,
+                'name': name,
+                'fields': record_data
+            })
     
     # Remove products that no longer have stock or were excluded
     for product_id, record in existing_products.items():
         if product_id not in products_to_keep:
-            try:
-                table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
-                table.delete(record['id'])
-                logger.info(f"Removed product: {record['fields'].get('Product Name', 'Unknown')}")
-                stats['removed'] += 1
-            except Exception as e:
-                logger.error(f"Error removing product {record['fields'].get('Product Name', 'Unknown')}: {str(e)}")
+            changes['deletes'].append({
+                'key': product_id,
+                'record_id': record['id'],
+                'name': record['fields'].get('Product Name', 'Unknown')
+            })
+    
+    return changes
+
+def apply_product_changes(target, changes):
+    """Write a product change set to a target's Airtable base"""
+    stats = target['stats']
+    stats['total'] = changes['total']
+    stats['processed'] += changes['total']
+    stats['skipped'] += changes['skipped']
+    
+    table = Api(AIRTABLE_API_KEY).table(target['base_id'], changes['table'])
+    
+    for change in changes['updates']:
+        name = change['name']
+        record_data = dict(change['fields'], **{'Last Updated': datetime.now().strftime('%m/%d/%Y %I:%M %p')})
+        try:
+            throttle(target)
+            table.update(change['record_id'], record_data)
+            logger.info(f"Updated product: {name}")
+            stats['updated'] += 1
+        except Exception as e:
+            logger.error(f"Error updating product {name}: {str(e)}")
+    
+    for change in changes['creates']:
+        name = change['name']
+        record_data = dict(change['fields'], **{'Last Updated': datetime.now().strftime('%m/%d/%Y %I:%M %p')})
+        try:
+            throttle(target)
+            table.create(record_data)
+            logger.info(f"Created product: {name}")
+            stats['created'] += 1
+        except Exception as e:
+            logger.error(f"Error creating product {name}: {str(e)}")
+    
+    for change in changes['deletes']:
+        name = change['name']
+        try:
+            throttle(target)
+            table.delete(change['record_id'])
+            logger.info(f"Removed product: {name}")
+            stats['removed'] += 1
+        except Exception as e:
+            logger.error(f"Error removing product {name}: {str(e)}")
+
+def sync_square_to_airtable(target, items):
+    """Sync Square products with stock at the target's location to its Airtable base"""
+    logger.info(f"Starting Square to Airtable sync for target {target['name']}...")
+    
+    apply_product_changes(target, plan_square_sync(target, items))
     
     # Log final stats
-    logger.info(f"Sync completed. Stats: {json.dumps(stats)}")
+    logger.info(f"Sync completed for target {target['name']}. Stats: {json.dumps(target['stats'])}")
 
 def fetch_square_vendors():
     """Fetch all vendors from Square API"""
@@ -419,6 +605,7 @@ def fetch_square_vendors():
             body["cursor"] = cursor
         
         try:
+            api_calls['square'] += 1
             response = requests.post(endpoint, headers=headers, json=body)
             response.raise_for_status()
             data = response.json()
@@ -473,15 +660,17 @@ def fetch_square_vendors():
     logger.info(f"Fetched {len(vendors)} vendors from Square")
     return vendors
 
-def sync_vendors_to_airtable():
-    """Sync Square vendors to Airtable"""
-    logger.info("Starting vendor sync...")
-    
-    # Get vendors from Square
-    vendors = fetch_square_vendors()
-    
+def plan_vendor_sync(target, vendors):
+    """Diff Square vendors against a target's Airtable vendors into a change set"""
     # Get existing vendors from Airtable
-    existing_vendors = get_existing_airtable_vendors()
+    existing_vendors = get_existing_airtable_vendors(target)
+    
+    changes = {
+        'table': target['vendor_table'],
+        'creates': [],
+        'updates': [],
+        'deletes': []
+    }
     
     # Track vendor IDs to keep
     vendors_to_keep = set()
@@ -494,63 +683,429 @@ def sync_vendors_to_airtable():
         # Record should be kept
         vendors_to_keep.add(vendor_id)
         
-        # Prepare Airtable record data
+        # Prepare Airtable record data; 'Last Synced' is stamped when the change is applied
         record_data = {
             'VendorID': vendor_id,
             'Name': name,
             'Phone': vendor['phone'],
             'Email': vendor['email'],
-            'Contact': vendor['contact_name'],
-            'Last Synced': datetime.now().strftime('%m/%d/%Y %I:%M %p')
+            'Contact': vendor['contact_name']
         }
         
         # Check if vendor already exists
         if vendor_id in existing_vendors:
-            # Update existing record
-            record = existing_vendors[vendor_id]
-            try:
-                table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_VENDOR_TABLE)
-                table.update(record['id'], record_data)
-                logger.info(f"Updated vendor: {name}")
-            except Exception as e:
-                logger.error(f"Error updating vendor {name}: {str(e)}")
-                # Try to create a new record if update fails
-                try:
-                    table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_VENDOR_TABLE)
-                    table.create(record_data)
-                    logger.info(f"Created new vendor record for: {name}")
-                except Exception as create_error:
-                    logger.error(f"Error creating new vendor record for {name}: {str(create_error)}")
+            changes['updates'].append({
+                'key': vendor_id,
+                'record_id': existing_vendors[vendor_id]['id'],
+                'name': name,
+                'fields': record_data
+            })
         else:
-            # Create new record
-            try:
-                table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_VENDOR_TABLE)
-                table.create(record_data)
-                logger.info(f"Created vendor: {name}")
-            except Exception as e:
-                logger.error(f"Error creating vendor {name}: {str(e)}")
+            changes['creates'].append({
+                'key': vendor_id,
+                'name': name,
+                'fields': record_data
+            })
     
     # Remove vendors that no longer exist in Square
     for vendor_id, record in existing_vendors.items():
         if vendor_id not in vendors_to_keep:
+            changes['deletes'].append({
+                'key': vendor_id,
+                'record_id': record['id'],
+                'name': record['fields'].get('Name', 'Unknown')
+            })
+    
+    return changes
+
+def apply_vendor_changes(target, changes):
+    """Write a vendor change set to a target's Airtable base"""
+    table = Api(AIRTABLE_API_KEY).table(target['base_id'], changes['table'])
+    
+    for change in changes['updates']:
+        name = change['name']
+        record_data = dict(change['fields'], **{'Last Synced': datetime.now().strftime('%m/%d/%Y %I:%M %p')})
+        try:
+            throttle(target)
+            table.update(change['record_id'], record_data)
+            logger.info(f"Updated vendor: {name}")
+        except Exception as e:
+            logger.error(f"Error updating vendor {name}: {str(e)}")
+            # Try to create a new record if update fails
             try:
-                table = Api(AIRTABLE_API_KEY).table(AIRTABLE_BASE_ID, AIRTABLE_VENDOR_TABLE)
-                table.delete(record['id'])
-                logger.info(f"Removed vendor: {record['fields'].get('Name', 'Unknown')}")
-            except Exception as e:
-                logger.error(f"Error removing vendor {record['fields'].get('Name', 'Unknown')}: {str(e)}")
+                throttle(target)
+                table.create(record_data)
+                logger.info(f"Created new vendor record for: {name}")
+            except Exception as create_error:
+                logger.error(f"Error creating new vendor record for {name}: {str(create_error)}")
+    
+    for change in changes['creates']:
+        name = change['name']
+        record_data = dict(change['fields'], **{'Last Synced': datetime.now().strftime('%m/%d/%Y %I:%M %p')})
+        try:
+            throttle(target)
+            table.create(record_data)
+            logger.info(f"Created vendor: {name}")
+        except Exception as e:
+            logger.error(f"Error creating vendor {name}: {str(e)}")
+    
+    for change in changes['deletes']:
+        name = change['name']
+        try:
+            throttle(target)
+            table.delete(change['record_id'])
+            logger.info(f"Removed vendor: {name}")
+        except Exception as e:
+            logger.error(f"Error removing vendor {name}: {str(e)}")
+
+def sync_vendors_to_airtable(target, vendors):
+    """Sync Square vendors to a target's Airtable base"""
+    logger.info(f"Starting vendor sync for target {target['name']}...")
+    
+    apply_vendor_changes(target, plan_vendor_sync(target, vendors))
+    
+    logger.info(f"Vendor sync completed for target {target['name']}")
+
+def for_each_target(targets, func):
+    """Run func for every target concurrently, within each base's rate budget"""
+    with ThreadPoolExecutor(max_workers=max(1, len(targets))) as executor:
+        return list(executor.map(func, targets))
+
+def vendor_targets(targets):
+    """Return one vendor sync target per distinct vendor table, shared by the targets using it"""
+    groups = {}
+    for target in targets:
+        key = (target['base_id'], target['vendor_table'])
+        if key not in groups:
+            groups[key] = {
+                'name': f"{target['base_id']}/{target['vendor_table']}",
+                'base_id': target['base_id'],
+                'vendor_table': target['vendor_table'],
+                'rate_limit': target['rate_limit'],
+                'stats': new_stats()
+            }
+    return list(groups.values())
+
+def fetch_shared_square_data(targets):
+    """Fetch vendors and the catalog once, with inventory for every target location"""
+    vendors = fetch_square_vendors()
+    items_by_location = fetch_square_items(sorted({target['location_id'] for target in targets}))
+    return vendors, items_by_location
+
+def log_run_summary(message, vendor_groups, targets):
+    """Log per-target stats for the whole run"""
+    summary = {
+        'vendors': {group['name']: group['stats'] for group in vendor_groups},
+        'targets': {target['name']: target['stats'] for target in targets}
+    }
+    logger.info(f"{message} Square requests: {api_calls['square']}. Stats: {json.dumps(summary)}")
+
+def run_sync(targets):
+    """Sync shared Square data into every target"""
+    vendors, items_by_location = fetch_shared_square_data(targets)
+    vendor_groups = vendor_targets(targets)
     
-    logger.info("Vendor sync completed")
+    # Sync vendors first, once per vendor table, then products for every target
+    for_each_target(vendor_groups, lambda group: sync_vendors_to_airtable(group, vendors))
+    for_each_target(targets, lambda target: sync_square_to_airtable(target, items_by_location[target['location_id']]))
+    
+    log_run_summary("Run completed.", vendor_groups, targets)
+
+def count_write_requests(changes):
+    """Count the Airtable requests needed to apply a change set, one per create, update and delete"""
+    return sum(len(changes[action]) for action in ('creates', 'updates', 'deletes'))
+
+def estimate_seconds(request_count, requests_per_second):
+    """Estimate wall time for a number of requests at a given rate"""
+    return round(request_count / requests_per_second, 1)
+
+def build_sync_plan(targets):
+    """Run the fetch and diff stages for every target without writing to Airtable"""
+    logger.info("Building sync plan...")
+    started = time.time()
+    
+    vendors, items_by_location = fetch_shared_square_data(targets)
+    vendor_groups = vendor_targets(targets)
+    
+    def plan_entry(target, section, changes):
+        return {
+            'name': target['name'],
+            'base_id': target['base_id'],
+            section: changes,
+            'estimate': {
+                'read': {'airtable_requests': target['stats']['airtable_requests']},
+                'apply': {'airtable_requests': count_write_requests(changes)}
+            }
+        }
+    
+    planned_vendors = for_each_target(
+        vendor_groups, lambda group: plan_entry(group, 'vendors', plan_vendor_sync(group, vendors)))
+    planned_targets = for_each_target(
+        targets, lambda target: plan_entry(target, 'products', plan_square_sync(target, items_by_location[target['location_id']])))
+    
+    plan = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'vendors': planned_vendors,
+        'targets': planned_targets
+    }
+    plan['estimate'] = estimate_plan(plan, vendor_groups + targets)
+    plan['estimate']['read']['elapsed_seconds'] = round(time.time() - started, 1)
+    return plan
+
+def estimate_plan(plan, targets):
+    """Estimate requests and wall time for reading and applying a plan, per base and overall"""
+    rates = {target['base_id']: target['rate_limit']['requests_per_second'] for target in targets}
+    
+    def base_requests(entries, phase):
+        requests_by_base = dict.fromkeys(rates, 0)
+        for entry in entries:
+            requests_by_base[entry['base_id']] += entry['estimate'][phase]['airtable_requests']
+        return requests_by_base
+    
+    def phase_seconds(entries, phase):
+        # Bases run concurrently, so the busiest base sets the pace
+        return max(
+            [estimate_seconds(count, rates[base_id]) for base_id, count in base_requests(entries, phase).items()],
+            default=0
+        )
+    
+    entries = plan['vendors'] + plan['targets']
+    bases = {}
+    for phase in ('read', 'apply'):
+        for base_id, count in base_requests(entries, phase).items():
+            bases.setdefault(base_id, {'requests_per_second': rates[base_id]})[phase] = {
+                'airtable_requests': count,
+                'estimated_seconds': estimate_seconds(count, rates[base_id])
+            }
+    
+    # Square is read once up front, then vendor tables and product tables are handled in turn
+    return {
+        'read': {
+            'square_requests': api_calls['square'],
+            'airtable_requests': sum(base['read']['airtable_requests'] for base in bases.values()),
+            'estimated_seconds': round(
+                estimate_seconds(api_calls['square'], SQUARE_REQUESTS_PER_SECOND)
+                + phase_seconds(plan['vendors'], 'read') + phase_seconds(plan['targets'], 'read'), 1)
+        },
+        'apply': {
+            'square_requests': 0,
+            'airtable_requests': sum(base['apply']['airtable_requests'] for base in bases.values()),
+            'estimated_seconds': round(phase_seconds(plan['vendors'], 'apply') + phase_seconds(plan['targets'], 'apply'), 1)
+        },
+        'bases': bases
+    }
+
+# The kinds of change a plan can hold for each table
+PLAN_ACTIONS = ('creates', 'updates', 'deletes')
+
+def plan_change_sets(plan):
+    """Yield (group, entry, section) for every change set in a plan"""
+    for entry in plan['vendors']:
+        yield 'vendors', entry, 'vendors'
+    for entry in plan['targets']:
+        yield 'targets', entry, 'products'
+
+def validate_plan(plan):
+    """Check that a plan has the structure apply_sync_plan relies on
+    
+    Raises ValueError describing the first problem found.
+    """
+    if not isinstance(plan, dict) or not isinstance(plan.get('generated_at'), str):
+        raise ValueError("Plan must be an object with a generated_at timestamp")
+    
+    for group in ('vendors', 'targets'):
+        if not isinstance(plan.get(group), list) or not all(isinstance(entry, dict) for entry in plan[group]):
+            raise ValueError(f"Plan must have a '{group}' list of objects")
+    
+    for group, entry, section in plan_change_sets(plan):
+        name = entry.get('name')
+        if not isinstance(name, str) or not isinstance(entry.get('base_id'), str):
+            raise ValueError(f"Plan {group} entry is missing its name or base_id")
+        
+        changes = entry.get(section)
+        if not isinstance(changes, dict) or not isinstance(changes.get('table'), str):
+            raise ValueError(f"Plan {group} entry {name} is missing its {section} change set")
+        if section == 'products' and not all(isinstance(changes.get(key), int) for key in ('total', 'skipped')):
+            raise ValueError(f"Plan {group} entry {name} is missing its product totals")
+        
+        for action in PLAN_ACTIONS:
+            if not isinstance(changes.get(action), list):
+                raise ValueError(f"Plan {group} entry {name} is missing its {section} {action}")
+            for change in changes[action]:
+                if not isinstance(change, dict) or 'key' not in change or 'name' not in change:
+                    raise ValueError(f"Plan {group} entry {name} has a malformed {section} {action} change")
+                if action != 'creates' and not isinstance(change.get('record_id'), str):
+                    raise ValueError(f"Plan {group} entry {name} has a {section} {action} change without a record_id")
+                if action != 'deletes' and not isinstance(change.get('fields'), dict):
+                    raise ValueError(f"Plan {group} entry {name} has a {section} {action} change without fields")
+
+def summarize_plan(plan):
+    """Return a one-line summary of a sync plan"""
+    counts = {'vendors': {}, 'targets': {}}
+    for group, entry, section in plan_change_sets(plan):
+        counts[group][entry['name']] = {action: len(entry[section][action]) for action in ('creates', 'updates', 'deletes')}
+    return json.dumps({'changes': counts, 'estimate': plan.get('estimate', {})})
+
+def plan_metadata(plan):
+    """Return a copy of a plan with its change lists emptied, for storing alongside CSV rows"""
+    metadata = json.loads(json.dumps(plan))
+    for group, entry, section in plan_change_sets(metadata):
+        for action in ('creates', 'updates', 'deletes'):
+            entry[section][action] = []
+    return metadata
+
+def write_plan(plan, path):
+    """Write a sync plan as JSON, or as a flat CSV change set if path ends in .csv
+    
+    CSV plans start with a metadata row (section 'plan') holding everything except the
+    change rows, so load_plan can rebuild the plan exactly.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['target', 'base_id', 'section', 'table', 'action', 'key', 'record_id', 'name', 'fields'])
+            writer.writerow(['', '', 'plan', '', 'metadata', '', '', '', json.dumps(plan_metadata(plan), separators=(',', ':'))])
+            for group, entry, section in plan_change_sets(plan):
+                changes = entry[section]
+                for action in ('creates', 'updates', 'deletes'):
+                    for change in changes[action]:
+                        writer.writerow([
+                            entry['name'],
+                            entry['base_id'],
+                            section,
+                            changes['table'],
+                            action,
+                            change['key'],
+                            change.get('record_id', ''),
+                            change['name'],
+                            json.dumps(change['fields'], separators=(',', ':')) if 'fields' in change else ''
+                        ])
+    else:
+        with open(path, 'w') as f:
+            json.dump(plan, f, separators=(',', ':'))
+    
+    logger.info(f"Wrote sync plan to {path}")
+
+def load_plan(path):
+    """Load a sync plan written by write_plan
+    
+    Raises ValueError if the file is not a well-formed plan.
+    """
+    if not path.lower().endswith('.csv'):
+        with open(path) as f:
+            plan = json.load(f)
+        validate_plan(plan)
+        return plan
+    
+    columns = ['target', 'base_id', 'section', 'table', 'action', 'key', 'record_id', 'name', 'fields']
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames != columns:
+            raise ValueError(f"CSV plan {path} must have the columns {', '.join(columns)}")
+        rows = list(reader)
+    
+    metadata_rows = [row for row in rows if row['section'] == 'plan']
+    if len(metadata_rows) != 1:
+        raise ValueError(f"CSV plan {path} must have exactly one metadata row")
+    plan = json.loads(metadata_rows[0]['fields'])
+    validate_plan(plan)
+    
+    entries = {(section, entry['name']): entry for group, entry, section in plan_change_sets(plan)}
+    for row in rows:
+        if row['section'] == 'plan':
+            continue
+        if row['section'] not in ('vendors', 'products') or row['action'] not in PLAN_ACTIONS:
+            raise ValueError(f"CSV plan {path} has an unknown change: {row['section']} {row['action']}")
+        
+        entry = entries.get((row['section'], row['target']))
+        if entry is None or entry['base_id'] != row['base_id']:
+            raise ValueError(f"CSV plan {path} has a change for unknown {row['section']} target {row['target']}")
+        
+        change = {'key': row['key'], 'name': row['name']}
+        if row['record_id']:
+            change['record_id'] = row['record_id']
+        if row['fields']:
+            change['fields'] = json.loads(row['fields'])
+        entry[row['section']][row['action']].append(change)
+    
+    validate_plan(plan)
+    return plan
+
+def match_plan_entries(entries, targets):
+    """Pair plan entries with the configured targets they were built for"""
+    targets_by_name = {target['name']: target for target in targets}
+    matched = []
+    for entry in entries:
+        target = targets_by_name.get(entry['name'])
+        if target is None:
+            logger.error(f"Plan target {entry['name']} is not configured, skipping")
+            continue
+        
+        # Record IDs in the plan only make sense for the base it was built against
+        if entry['base_id'] != target['base_id']:
+            logger.error(f"Plan target {entry['name']} was built for base {entry['base_id']}, not {target['base_id']}, skipping")
+            continue
+        
+        matched.append((target, entry))
+    return matched
+
+def apply_sync_plan(plan, targets):
+    """Apply a previously built sync plan without refetching from Square or Airtable
+    
+    Raises ValueError if the plan is malformed or older than PLAN_MAX_AGE_MINUTES.
+    """
+    logger.info("Applying sync plan...")
+    
+    validate_plan(plan)
+    generated_at = plan['generated_at']
+    age_minutes = (datetime.now() - datetime.fromisoformat(generated_at)).total_seconds() / 60
+    if age_minutes > PLAN_MAX_AGE_MINUTES:
+        raise ValueError(
+            f"Plan was generated at {generated_at}, {age_minutes:.0f} minutes ago, "
+            f"which is older than PLAN_MAX_AGE_MINUTES ({PLAN_MAX_AGE_MINUTES:g}). Generate a new plan."
+        )
+    
+    vendor_work = match_plan_entries(plan['vendors'], vendor_targets(targets))
+    product_work = match_plan_entries(plan['targets'], targets)
+    
+    # Apply vendors first, then products, matching the live sync
+    for_each_target(vendor_work, lambda work: apply_vendor_changes(work[0], work[1]['vendors']))
+    for_each_target(product_work, lambda work: apply_product_changes(work[0], work[1]['products']))
+    
+    log_run_summary("Plan applied.", [target for target, _ in vendor_work], [target for target, _ in product_work])
 
 if __name__ == "__main__":
-    if not SQUARE_ACCESS_TOKEN:
+    parser = argparse.ArgumentParser(description="Sync Square vendors and products to Airtable")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--plan', nargs='?', const=PLAN_FILE, metavar='PATH',
+                      help=f"fetch and diff only, writing the change set to PATH (.json or .csv, default {PLAN_FILE})")
+    mode.add_argument('--apply-plan', nargs='?', const=PLAN_FILE, metavar='PATH',
+                      help=f"apply a change set written by --plan without refetching (default {PLAN_FILE})")
+    args = parser.parse_args()
+    
+    if not SQUARE_ACCESS_TOKEN and not args.apply_plan:
         logger.error("Square API token is not configured")
         exit(1)
+    
+    try:
+        targets = load_sync_targets()
+    except ValueError as e:
+        logger.error(f"Invalid sync target configuration: {str(e)}")
+        exit(1)
         
-    if not AIRTABLE_API_KEY or not AIRTABLE_BASE_ID:
+    if not AIRTABLE_API_KEY or not all(target['base_id'] for target in targets):
         logger.error("Airtable credentials are not configured")
         exit(1)
-        
-    # Run the syncs
-    sync_vendors_to_airtable()  # Sync vendors first
-    sync_square_to_airtable()   # Then sync products
\ No newline at end of file
+    
+    try:
+        if args.plan:
+            plan = build_sync_plan(targets)
+            write_plan(plan, args.plan)
+            logger.info(f"Plan summary: {summarize_plan(plan)}")
+        elif args.apply_plan:
+            apply_sync_plan(load_plan(args.apply_plan), targets)
+        else:
+            run_sync(targets)
+    except (RuntimeError, ValueError) as e:
+        logger.error(f"Sync aborted: {str(e)}")
+        exit(1)
\ No newline at end of file
@@ -1,7 +1,10 @@
-from flask import Flask, render_template_string, redirect, url_for
+from flask import Flask, render_template_string, redirect, url_for, send_file
 import threading
 import subprocess
 import sys
+import csv
+import json
+from datetime import datetime
 import signal
 import os
 import psutil
@@ -12,12 +15,18 @@ app = Flask(__name__)
 current_sync_process = None
 sync_thread = None
 
-def run_worker():
+# Where plan runs write their change set
+PLAN_FILE = os.environ.get('PLAN_FILE', 'sync_plan.json')
+
+# Plans older than this are refused by airtable-coa.py --apply-plan
+PLAN_MAX_AGE_MINUTES = float(os.environ.get('PLAN_MAX_AGE_MINUTES', '60'))
+
+def run_worker(*args):
     global current_sync_process
     try:
         # Create a new process group
         current_sync_process = subprocess.Popen(
-            [sys.executable, 'airtable-coa.py'],
+            [sys.executable, 'airtable-coa.py', *args],
             preexec_fn=os.setsid  # This creates a new process group
         )
         current_sync_process.wait()
@@ -26,6 +35,27 @@ def run_worker():
     finally:
         current_sync_process = None
 
+def plan_status():
+    """Return when the current plan was generated, its age and whether it is too old to apply,
+    or None if there is no readable plan"""
+    try:
+        with open(PLAN_FILE, newline='') as f:
+            if PLAN_FILE.lower().endswith('.csv'):
+                # The first row of a CSV plan holds the plan metadata
+                plan = json.loads(next(csv.DictReader(f))['fields'])
+            else:
+                plan = json.load(f)
+        generated_at = plan['generated_at']
+        age_minutes = (datetime.now() - datetime.fromisoformat(generated_at)).total_seconds() / 60
+    except Exception:
+        return None
+    
+    return {
+        'generated_at': generated_at,
+        'age_minutes': int(age_minutes),
+        'is_stale': age_minutes > PLAN_MAX_AGE_MINUTES
+    }
+
 def is_process_running(pid):
     try:
         process = psutil.Process(pid)
@@ -93,6 +123,20 @@ def trigger_sync():
                 <form action="/sync" method="post">
                     <button type="submit" class="button">Start Sync</button>
                 </form>
+                <form action="/plan" method="post">
+                    <button type="submit" class="button refresh-button">Generate Plan</button>
+                </form>
+                {% if plan %}
+                    {% if plan.is_stale %}
+                        <p>Plan generated at {{ plan.generated_at }} ({{ plan.age_minutes }} minutes ago) is too old to apply. Generate a new plan.</p>
+                    {% else %}
+                        <form action="/plan/apply" method="post">
+                            <button type="submit" class="button">Apply Plan</button>
+                            Plan generated at {{ plan.generated_at }} ({{ plan.age_minutes }} minutes ago)
+                        </form>
+                    {% endif %}
+                    <p><a href="/plan">View current plan</a></p>
+                {% endif %}
             {% endif %}
             <form action="/sync" method="get" style="margin-top: 10px;">
                 <button type="submit" class="button refresh-button">Refresh Status</button>
@@ -102,14 +146,36 @@ def trigger_sync():
     </html>
     """
     
-    return render_template_string(html_template, is_syncing=is_syncing)
+    return render_template_string(html_template, is_syncing=is_syncing, plan=plan_status())
 
-@app.route('/sync', methods=['POST'])
-def start_sync():
-    global current_sync_process, sync_thread
+def start_worker(*args):
+    global sync_thread
     if current_sync_process is None or current_sync_process.poll() is not None:
-        sync_thread = threading.Thread(target=run_worker)
+        sync_thread = threading.Thread(target=run_worker, args=args)
         sync_thread.start()
+
+@app.route('/sync', methods=['POST'])
+def start_sync():
+    start_worker()
+    return redirect(url_for('trigger_sync'))
+
+@app.route('/plan')
+def view_plan():
+    if not os.path.exists(PLAN_FILE):
+        return "No sync plan has been generated yet", 404
+    mimetype = 'text/csv' if PLAN_FILE.lower().endswith('.csv') else 'application/json'
+    return send_file(os.path.abspath(PLAN_FILE), mimetype=mimetype)
+
+@app.route('/plan', methods=['POST'])
+def start_plan():
+    start_worker('--plan', PLAN_FILE)
+    return redirect(url_for('trigger_sync'))
+
+@app.route('/plan/apply', methods=['POST'])
+def apply_plan():
+    plan = plan_status()
+    if plan and not plan['is_stale']:
+        start_worker('--apply-plan', PLAN_FILE)
     return redirect(url_for('trigger_sync'))
 
 @app.route('/cancel', methods=['POST'])
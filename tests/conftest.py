@@ -0,0 +1,132 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'airtable-coa.py')
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeSquare:
+    """Square API with one vendor and one item with two variations, both stocked at every location"""
+
+    def __init__(self):
+        self.fail_inventory = False
+
+    def get(self, url, headers=None):
+        if 'types=CATEGORY' in url:
+            return FakeResponse({'objects': [{'type': 'CATEGORY', 'id': 'c1', 'category_data': {'name': 'Flower'}}]})
+        return FakeResponse({'objects': [{
+            'type': 'ITEM',
+            'id': 'i1',
+            'item_data': {
+                'name': 'Gummies',
+                'category_id': 'c1',
+                'variations': [
+                    {'id': 'v1', 'item_variation_data': {'name': '10ct', 'sku': 'G10'}},
+                    {'id': 'v2', 'item_variation_data': {'name': '20ct', 'sku': 'G20'}}
+                ]
+            }
+        }]})
+
+    def post(self, url, headers=None, json=None):
+        if 'vendors' in url:
+            return FakeResponse({'vendors': [{'id': 'VEN1', 'name': 'Farm Co'}]})
+        if self.fail_inventory:
+            raise Exception("inventory unavailable")
+        return FakeResponse({'counts': [
+            {'catalog_object_id': object_id, 'location_id': location_id, 'quantity': '5'}
+            for object_id in json['catalog_object_ids']
+            for location_id in json['location_ids']
+        ]})
+
+
+class FakeAirtable:
+    """In-memory Airtable keyed by (base_id, table)"""
+
+    def __init__(self):
+        self.tables = {}
+        self.next_id = 0
+
+    def add(self, base_id, table, fields):
+        self.next_id += 1
+        record = {'id': f"rec{self.next_id}", 'fields': dict(fields)}
+        self.tables.setdefault((base_id, table), []).append(record)
+        return record
+
+    def records(self, base_id, table):
+        return self.tables.get((base_id, table), [])
+
+    def Api(self, api_key):
+        return FakeApi(self)
+
+
+class FakeApi:
+    def __init__(self, airtable):
+        self.airtable = airtable
+
+    def table(self, base_id, table):
+        return FakeTable(self.airtable, base_id, table)
+
+
+class FakeTable:
+    def __init__(self, airtable, base_id, table):
+        self.airtable = airtable
+        self.key = (base_id, table)
+
+    def iterate(self):
+        records = list(self.airtable.tables.get(self.key, []))
+        # Like the real API, an empty table still returns one (empty) page
+        for start in range(0, max(len(records), 1), 100):
+            yield records[start:start + 100]
+
+    def create(self, fields):
+        return self.airtable.add(*self.key, fields)
+
+    def update(self, record_id, fields):
+        for record in self.airtable.tables[self.key]:
+            if record['id'] == record_id:
+                record['fields'].update(fields)
+
+    def delete(self, record_id):
+        self.airtable.tables[self.key] = [r for r in self.airtable.tables[self.key] if r['id'] != record_id]
+
+
+@pytest.fixture
+def load_coa(monkeypatch, tmp_path):
+    """Load airtable-coa.py against fake Square and Airtable APIs with the given SYNC_TARGETS"""
+    monkeypatch.chdir(tmp_path)
+    square = FakeSquare()
+    airtable = FakeAirtable()
+
+    def load(targets):
+        monkeypatch.setenv('SYNC_TARGETS', json.dumps(targets))
+        spec = importlib.util.spec_from_file_location('airtable_coa', SCRIPT)
+        coa = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(coa)
+        monkeypatch.setattr(coa.requests, 'get', square.get)
+        monkeypatch.setattr(coa.requests, 'post', square.post)
+        monkeypatch.setattr(coa, 'Api', airtable.Api)
+        return coa
+
+    return load, square, airtable
+
+
+@pytest.fixture
+def sync_targets():
+    """Two stores in one base, each with its own product table and a shared vendor table"""
+    return [
+        {'name': 'store1', 'location_id': 'L1', 'base_id': 'app1', 'requests_per_second': 1000},
+        {'name': 'store2', 'location_id': 'L2', 'base_id': 'app1', 'table': 'Store2', 'requests_per_second': 1000}
+    ]
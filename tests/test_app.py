@@ -0,0 +1,52 @@
+import importlib.util
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+
+@pytest.fixture
+def web(monkeypatch, tmp_path):
+    """Load app.py with its plan file in a temporary directory and worker starts recorded"""
+    spec = importlib.util.spec_from_file_location('sync_app', APP)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    monkeypatch.setattr(app, 'PLAN_FILE', str(tmp_path / 'sync_plan.json'))
+    started = []
+    monkeypatch.setattr(app, 'start_worker', lambda *args: started.append(args))
+    return app, started
+
+
+def write_plan(app, age_minutes):
+    generated_at = (datetime.now() - timedelta(minutes=age_minutes)).isoformat(timespec='seconds')
+    with open(app.PLAN_FILE, 'w') as f:
+        json.dump({'generated_at': generated_at, 'vendors': [], 'targets': []}, f)
+
+
+def test_fresh_plan_can_be_applied(web):
+    app, started = web
+    write_plan(app, 5)
+    client = app.app.test_client()
+
+    page = client.get('/sync').get_data(as_text=True)
+    client.post('/plan/apply')
+
+    assert 'Apply Plan' in page
+    assert '(5 minutes ago)' in page
+    assert started == [('--apply-plan', app.PLAN_FILE)]
+
+
+def test_stale_plan_is_not_offered_or_applied(web):
+    app, started = web
+    write_plan(app, app.PLAN_MAX_AGE_MINUTES + 5)
+    client = app.app.test_client()
+
+    page = client.get('/sync').get_data(as_text=True)
+    client.post('/plan/apply')
+
+    assert 'Apply Plan' not in page
+    assert 'too old to apply' in page
+    assert started == []
@@ -0,0 +1,50 @@
+import pytest
+
+
+def test_shared_vendor_table_is_synced_once(load_coa, sync_targets):
+    load, square, airtable = load_coa
+    coa = load(sync_targets)
+
+    coa.run_sync(coa.load_sync_targets())
+
+    assert len(airtable.records('app1', 'Vendors')) == 1
+
+
+def test_airtable_reads_are_throttled_per_page(load_coa, sync_targets):
+    load, square, airtable = load_coa
+    coa = load(sync_targets)
+    for i in range(250):
+        airtable.add('app1', 'Products', {'ProductID': f"p{i}"})
+    target = coa.load_sync_targets()[0]
+
+    assert len(coa.get_existing_airtable_products(target)) == 250
+    assert target['stats']['airtable_requests'] == 3
+
+
+def test_inventory_failure_aborts_before_writing(load_coa, sync_targets):
+    load, square, airtable = load_coa
+    coa = load(sync_targets)
+    airtable.add('app1', 'Products', {'ProductID': 'v1', 'Product Name': 'Gummies - 10ct'})
+    square.fail_inventory = True
+
+    with pytest.raises(RuntimeError):
+        coa.run_sync(coa.load_sync_targets())
+    assert [r['fields']['ProductID'] for r in airtable.records('app1', 'Products')] == ['v1']
+
+
+@pytest.mark.parametrize('targets', [
+    {'base_id': 'app1'},
+    [],
+    ['app1'],
+    [{'base_id': 'app1', 'requests_per_second': 0}],
+    [{'base_id': 'app1', 'location_id': ''}],
+    [{'base_id': 'app1', 'location_id': None}],
+    [{'base_id': 'app1'}, {'base_id': 'app1'}],
+    [{'name': 'a', 'location_id': 'L1', 'base_id': 'app1'}, {'name': 'b', 'location_id': 'L2', 'base_id': 'app1'}]
+])
+def test_invalid_sync_targets_are_rejected(load_coa, targets):
+    load, square, airtable = load_coa
+    coa = load(targets)
+
+    with pytest.raises(ValueError):
+        coa.load_sync_targets()
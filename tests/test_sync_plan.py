@@ -0,0 +1,71 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.mark.parametrize('extension', ['json', 'csv'])
+def test_plan_round_trip_and_apply(load_coa, sync_targets, tmp_path, extension):
+    load, square, airtable = load_coa
+    coa = load(sync_targets)
+    airtable.add('app1', 'Products', {'ProductID': 'v1', 'Product Name': 'Gummies - 10ct'})
+    airtable.add('app1', 'Products', {'ProductID': 'gone', 'Product Name': 'Old product'})
+
+    plan = coa.build_sync_plan(coa.load_sync_targets())
+    path = str(tmp_path / f"plan.{extension}")
+    coa.write_plan(plan, path)
+    loaded = coa.load_plan(path)
+
+    assert loaded == json.loads(json.dumps(plan))
+    assert all('Last Updated' not in change['fields'] for change in plan['targets'][0]['products']['updates'])
+    assert airtable.records('app1', 'Vendors') == []  # planning does not write
+
+    coa.apply_sync_plan(loaded, coa.load_sync_targets())
+
+    assert [r['fields']['VendorID'] for r in airtable.records('app1', 'Vendors')] == ['VEN1']
+    assert sorted(r['fields']['ProductID'] for r in airtable.records('app1', 'Products')) == ['v1', 'v2']
+    assert sorted(r['fields']['ProductID'] for r in airtable.records('app1', 'Store2')) == ['v1', 'v2']
+    assert all('Last Updated' in r['fields'] for r in airtable.records('app1', 'Products'))
+
+
+def test_apply_plan_skips_targets_built_for_another_base(load_coa, sync_targets):
+    load, square, airtable = load_coa
+    coa = load(sync_targets)
+    plan = coa.build_sync_plan(coa.load_sync_targets())
+
+    moved = [dict(target, base_id='app2') for target in sync_targets]
+    coa = load(moved)
+    coa.apply_sync_plan(plan, coa.load_sync_targets())
+
+    assert airtable.tables == {}
+
+
+def test_apply_plan_refuses_stale_plan(load_coa, sync_targets):
+    load, square, airtable = load_coa
+    coa = load(sync_targets)
+    plan = coa.build_sync_plan(coa.load_sync_targets())
+    plan['generated_at'] = (datetime.now() - timedelta(minutes=coa.PLAN_MAX_AGE_MINUTES + 1)).isoformat()
+
+    with pytest.raises(ValueError):
+        coa.apply_sync_plan(plan, coa.load_sync_targets())
+    assert airtable.tables == {}
+
+
+@pytest.mark.parametrize('extension, corrupt', [
+    ('csv', lambda text: text.replace(',creates,', ',upserts,', 1)),
+    ('csv', lambda text: text.replace(',products,', ',widgets,', 1)),
+    ('csv', lambda text: text.splitlines()[0] + '\n'),
+    ('json', lambda text: text.replace('"products"', '"items"')),
+    ('json', lambda text: text.replace('"record_id"', '"id"')),
+    ('json', lambda text: '[]')
+])
+def test_malformed_plan_is_rejected(load_coa, sync_targets, tmp_path, extension, corrupt):
+    load, square, airtable = load_coa
+    coa = load(sync_targets)
+    airtable.add('app1', 'Products', {'ProductID': 'v1', 'Product Name': 'Gummies - 10ct'})
+    path = tmp_path / f"plan.{extension}"
+    coa.write_plan(coa.build_sync_plan(coa.load_sync_targets()), str(path))
+    path.write_text(corrupt(path.read_text()))
+
+    with pytest.raises(ValueError):
+        coa.load_plan(str(path))